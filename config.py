@@ -38,3 +38,5 @@ MIN_DURATION_HOURS = 1
 MAX_DURATION_HOURS = 750
 DATA_FILE = "members.json"
 CHECK_INTERVAL = 60  # Vérifier expirations toutes les 60 secondes
+SNAPSHOT_FILE = "snapshot.json"  # État sauvegardé à l'arrêt pour un redémarrage rapide
+SHUTDOWN_TIMEOUT = int(os.getenv("SHUTDOWN_TIMEOUT", "20"))  # Délai max (s) pour terminer les tâches en cours
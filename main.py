@@ -4,8 +4,12 @@ Utilise python-telegram-bot + aiohttp pour le keep-alive
 """
 
 import asyncio
+import bisect
 import json
 import logging
+import os
+import signal
+import time
 from datetime import datetime
 from aiohttp import web
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -16,7 +20,8 @@ from telegram.ext import (
 
 from config import (
     BOT_TOKEN, CHANNEL_ID, CHANNEL_LINK, CHANNEL_NAME, ADMINS, PORT,
-    MIN_DURATION_HOURS, MAX_DURATION_HOURS, DATA_FILE, CHECK_INTERVAL
+    MIN_DURATION_HOURS, MAX_DURATION_HOURS, DATA_FILE, CHECK_INTERVAL,
+    SNAPSHOT_FILE, SHUTDOWN_TIMEOUT
 )
 
 # Logging
@@ -29,15 +34,25 @@ logger = logging.getLogger(__name__)
 # États pour la conversation
 NOM, PRENOM, PAYS = range(3)
 
+# État en mémoire (restauré depuis le snapshot au démarrage)
+_store = None              # Données chargées depuis DATA_FILE
+_expiry_index = []         # Liste triée de (expires_at, user_id_str)
+_scheduler_state = {"last_check": 0}
+
 # ═══════════════════════════════════════════════════════════════
 # FONCTIONS DE DONNÉES
 # ═══════════════════════════════════════════════════════════════
 
 def load_data():
-    """Charge les données JSON"""
+    """Charge les données JSON (depuis la mémoire si déjà chargées)"""
+    global _store
+    if _store is not None:
+        return _store
     try:
         with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+            _store = json.load(f)
+        rebuild_expiry_index(_store)
+        return _store
     except FileNotFoundError:
         data = {
             "channel_id": CHANNEL_ID,
@@ -56,8 +71,66 @@ def load_data():
 
 def save_data(data):
     """Sauvegarde les données JSON"""
+    global _store
     with open(DATA_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
+    _store = data
+    rebuild_expiry_index(data)
+
+
+def rebuild_expiry_index(data):
+    """Reconstruit l'index des expirations trié par date"""
+    global _expiry_index
+    _expiry_index = sorted(
+        (member.get("expires_at", 0), user_id_str)
+        for user_id_str, member in data.get("members", {}).items()
+    )
+
+
+def due_expirations(current_time):
+    """Retourne les membres dont l'accès a expiré, via l'index"""
+    end = bisect.bisect_right(_expiry_index, (current_time, "\uffff"))
+    return [user_id_str for _, user_id_str in _expiry_index[:end]]
+
+
+def write_snapshot():
+    """Écrit le snapshot (données, index, planificateur) pour un redémarrage rapide"""
+    if _store is None:
+        return
+    save_data(_store)
+    snapshot = {
+        "saved_at": int(time.time()),
+        "data_mtime": os.path.getmtime(DATA_FILE),
+        "store": _store,
+        "expiry_index": _expiry_index,
+        "scheduler": _scheduler_state,
+    }
+    tmp_file = f"{SNAPSHOT_FILE}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_file, SNAPSHOT_FILE)
+    logger.info(f"💾 Snapshot écrit ({len(_expiry_index)} membre(s))")
+
+
+def load_snapshot():
+    """Restaure l'état depuis le snapshot s'il correspond encore à DATA_FILE"""
+    global _store, _expiry_index, _scheduler_state
+    try:
+        with open(SNAPSHOT_FILE, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("data_mtime") != os.path.getmtime(DATA_FILE):
+            logger.info("Snapshot obsolète, rechargement depuis les données")
+            return False
+        store = snapshot["store"]
+        expiry_index = [tuple(entry) for entry in snapshot["expiry_index"]]
+        scheduler_state = snapshot.get("scheduler", {"last_check": 0})
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.error(f"Erreur load_snapshot: {e}")
+        return False
+    _store, _expiry_index, _scheduler_state = store, expiry_index, scheduler_state
+    return True
 
 
 def is_admin(user_id):
@@ -103,6 +176,7 @@ async def start_web_server():
     site = web.TCPSite(runner, '0.0.0.0', PORT)
     await site.start()
     logger.info(f"🌐 Serveur web démarré sur le port {PORT}")
+    return runner
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -527,18 +601,27 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # TÂCHE DE VÉRIFICATION DES EXPIRATIONS
 # ═══════════════════════════════════════════════════════════════
 
-async def check_expirations_task(application: Application):
-    """Vérifie les expirations en arrière-plan"""
-    while True:
+async def check_expirations_task(application: Application, stop_event: asyncio.Event):
+    """Vérifie les expirations en arrière-plan jusqu'à la demande d'arrêt"""
+    # Reprendre le rythme du planificateur après un redémarrage
+    delay = _scheduler_state.get("last_check", 0) + CHECK_INTERVAL - time.time()
+    
+    while not stop_event.is_set():
+        if delay > 0:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                break
+            except asyncio.TimeoutError:
+                pass
+        delay = CHECK_INTERVAL
+        
         try:
             data = load_data()
             current_time = int(datetime.now().timestamp())
-            to_remove = []
-            
-            for user_id_str, member in data.get("members", {}).items():
-                if member.get("expires_at", 0) <= current_time:
-                    user_id = int(user_id_str)
-                    to_remove.append((user_id, user_id_str))
+            to_remove = [
+                (int(user_id_str), user_id_str)
+                for user_id_str in due_expirations(current_time)
+            ]
             
             for user_id, user_id_str in to_remove:
                 try:
@@ -566,11 +649,41 @@ async def check_expirations_task(application: Application):
             
             if to_remove:
                 save_data(data)
+            _scheduler_state["last_check"] = current_time
                 
         except Exception as e:
             logger.error(f"Erreur check_expirations: {e}")
-        
-        await asyncio.sleep(CHECK_INTERVAL)
+
+
+async def shutdown(application: Application, runner: web.AppRunner, expirations_task: asyncio.Task):
+    """Arrête la réception, termine le travail en cours puis écrit le snapshot"""
+    logger.info("🛑 Arrêt demandé, fin des tâches en cours...")
+    
+    async def drain():
+        # Ne plus recevoir de mises à jour
+        await application.updater.stop()
+        # Laisser finir la vérification des expirations et les handlers en cours
+        await expirations_task
+        await application.stop()
+    
+    try:
+        await asyncio.wait_for(drain(), timeout=SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Délai d'arrêt dépassé ({SHUTDOWN_TIMEOUT}s), tâches interrompues")
+    except Exception as e:
+        logger.error(f"Erreur arrêt: {e}")
+    
+    try:
+        write_snapshot()
+    except Exception as e:
+        logger.error(f"Erreur write_snapshot: {e}")
+    
+    try:
+        await application.shutdown()
+    except Exception as e:
+        logger.error(f"Erreur shutdown: {e}")
+    await runner.cleanup()
+    logger.info("👋 Bot arrêté proprement")
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -580,6 +693,22 @@ async def check_expirations_task(application: Application):
 async def main():
     """Fonction principale"""
     logger.info("🤖 Démarrage du bot...")
+    started = time.monotonic()
+    
+    # Redémarrage rapide depuis le snapshot si disponible
+    if load_snapshot():
+        logger.info(f"⚡ Snapshot restauré ({len(_expiry_index)} membre(s))")
+    else:
+        load_data()
+    
+    # Arrêt propre sur SIGTERM (Render) / SIGINT
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass  # Windows
     
     # Créer l'application
     application = Application.builder().token(BOT_TOKEN).build()
@@ -605,22 +734,22 @@ async def main():
     application.add_handler(CommandHandler("help", help_command))
     
     # Démarrer le serveur web
-    await start_web_server()
+    runner = await start_web_server()
     
     # Démarrer la tâche de vérification
-    asyncio.create_task(check_expirations_task(application))
+    expirations_task = asyncio.create_task(check_expirations_task(application, stop_event))
     
     # Démarrer le bot
     await application.initialize()
     await application.start()
-    logger.info("✅ Bot démarré avec succès!")
     
     # Garder le bot en vie
     await application.updater.start_polling(drop_pending_updates=True)
+    logger.info(f"✅ Bot démarré avec succès en {time.monotonic() - started:.2f}s!")
     
-    # Boucle infinie
-    while True:
-        await asyncio.sleep(3600)
+    # Attendre le signal d'arrêt
+    await stop_event.wait()
+    await shutdown(application, runner, expirations_task)
 
 
 if __name__ == "__main__":